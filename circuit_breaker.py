@@ -0,0 +1,103 @@
+import logging
+import threading
+import time
+from enum import Enum
+
+logger = logging.getLogger(__name__)
+
+class BreakerState(Enum):
+    """Состояния предохранителя"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __str__(self):
+        return self.value
+
+class CircuitBreaker:
+    """
+    Предохранитель для внешней зависимости
+
+    После failure_threshold ошибок подряд предохранитель размыкается:
+    запросы сразу отклоняются, а в фоновом потоке с растущей задержкой
+    вызывается probe(). Как только probe() возвращает True, предохранитель
+    снова замыкается.
+    """
+
+    def __init__(self, name, probe, failure_threshold=3, initial_delay=5, max_delay=300):
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+        self._probe_thread = None
+
+    def allow_request(self):
+        """Проверяет, можно ли выполнять запрос к зависимости"""
+        return self.state == BreakerState.CLOSED
+
+    def record_success(self):
+        """Отмечает успешный запрос"""
+        self.failures = 0
+
+    def record_failure(self):
+        """Отмечает неудачный запрос; размыкает предохранитель при превышении порога"""
+        with self._lock:
+            self.failures += 1
+            should_open = self.failures >= self.failure_threshold
+        if should_open:
+            self.open()
+
+    def open(self):
+        """Размыкает предохранитель и запускает фоновые проверки"""
+        with self._lock:
+            if self.state != BreakerState.OPEN:
+                self.state = BreakerState.OPEN
+                self.opened_at = time.time()
+                logger.warning(f"Circuit breaker '{self.name}' opened (consecutive failures: {self.failures})")
+
+            if self._probe_thread is None:
+                self._probe_thread = threading.Thread(
+                    target=self._probe_loop, name=f"{self.name}-probe", daemon=True
+                )
+                self._probe_thread.start()
+
+    def close(self):
+        """Замыкает предохранитель"""
+        with self._lock:
+            self.state = BreakerState.CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self._probe_thread = None
+        logger.info(f"Circuit breaker '{self.name}' closed")
+
+    def _probe_loop(self):
+        """Проверяет доступность зависимости с экспоненциальной задержкой"""
+        delay = self.initial_delay
+        while True:
+            time.sleep(delay)
+            try:
+                recovered = self.probe()
+            except Exception as e:
+                logger.error(f"Circuit breaker '{self.name}' probe failed: {e}")
+                recovered = False
+
+            if recovered:
+                self.close()
+                return
+
+            delay = min(delay * 2, self.max_delay)
+            logger.info(f"Circuit breaker '{self.name}' still open, next probe in {delay} s")
+
+    def get_status(self):
+        """Возвращает текущее состояние предохранителя"""
+        return {
+            "state": str(self.state),
+            "failures": self.failures,
+            "opened_at": self.opened_at,
+        }
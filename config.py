@@ -9,7 +9,38 @@ import json
 
 # Google Sheets configuration
 GOOGLE_SHEETS_ID = os.getenv("GOOGLE_SHEETS_ID")
-GOOGLE_SHEETS_RANGE = os.getenv("GOOGLE_SHEETS_RANGE", "Sheet1!A:D")
+GOOGLE_SHEETS_RANGE = os.getenv("GOOGLE_SHEETS_RANGE", "Sheet1!A:F")
+
+# Количество повторных попыток добавления строки после ошибки
+SHEETS_APPEND_RETRIES = int(os.getenv("SHEETS_APPEND_RETRIES", "2"))
+# Пауза перед первой повторной попыткой (секунды), далее удваивается
+SHEETS_RETRY_BACKOFF_SECONDS = float(os.getenv("SHEETS_RETRY_BACKOFF_SECONDS", "1"))
+
+# Таймаут запросов к Google Sheets и параметры предохранителя
+SHEETS_TIMEOUT_SECONDS = float(os.getenv("SHEETS_TIMEOUT_SECONDS", "10"))
+SHEETS_FAILURE_THRESHOLD = int(os.getenv("SHEETS_FAILURE_THRESHOLD", "3"))
+SHEETS_PROBE_INITIAL_DELAY = float(os.getenv("SHEETS_PROBE_INITIAL_DELAY", "5"))
+SHEETS_PROBE_MAX_DELAY = float(os.getenv("SHEETS_PROBE_MAX_DELAY", "300"))
+
+# Архивация старых строк в листы "Архив ГГГГ-ММ" (0 - ограничение не используется,
+# по умолчанию архивация выключена)
+ARCHIVE_MAX_AGE_DAYS = int(os.getenv("ARCHIVE_MAX_AGE_DAYS", "0"))
+ARCHIVE_MAX_ROWS = int(os.getenv("ARCHIVE_MAX_ROWS", "0"))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "86400"))
+
+# Логирование
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_LIMIT = int(os.getenv("LOG_SAMPLE_LIMIT", "20"))
+
+# Профилирование (см. profiling.py)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0.1"))
+PROFILING_WINDOW_SECONDS = int(os.getenv("PROFILING_WINDOW_SECONDS", "300"))
+SLOW_CALL_THRESHOLD_MS = float(os.getenv("SLOW_CALL_THRESHOLD_MS", "1000"))
+
+# ID пользователей Telegram с доступом к служебным командам (через запятую)
+ADMIN_IDS = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()}
 
 if not GOOGLE_SHEETS_ID:
     raise ValueError("GOOGLE_SHEETS_ID environment variable is required")
@@ -0,0 +1,122 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from validators import redact_pii
+
+# ID текущего обновления Telegram для связывания записей лога
+correlation_id = contextvars.ContextVar("correlation_id", default="-")
+
+def set_correlation_id(value):
+    """
+    Устанавливает ID корреляции для текущего контекста (обновления)
+
+    Returns:
+        Token: Токен для reset_correlation_id
+    """
+    return correlation_id.set(str(value))
+
+def reset_correlation_id(token):
+    """Восстанавливает ID корреляции, действовавший до set_correlation_id"""
+    correlation_id.reset(token)
+
+class ContextFilter(logging.Filter):
+    """Добавляет к записи ID корреляции; выполняется в потоке, создавшем запись"""
+
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    Ограничивает частые сообщения уровня ниже WARNING
+
+    Для каждого места вызова пропускается не более limit записей в секунду,
+    число отброшенных записей добавляется к следующей пропущенной.
+    """
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        # (файл, строка) -> [начало окна, записей в окне, отброшено]
+        self._windows = {}
+
+    def filter(self, record):
+        if not self.limit or record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        window = self._windows.get(key)
+
+        if window is None or now - window[0] >= 1:
+            dropped = window[2] if window else 0
+            self._windows[key] = [now, 1, 0]
+            record.sampled_out = dropped
+            return True
+
+        if window[1] < self.limit:
+            window[1] += 1
+            record.sampled_out = window[2]
+            window[2] = 0
+            return True
+
+        window[2] += 1
+        return False
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись в одну строку JSON и удаляет из сообщения email и телефоны"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "correlation_id": getattr(record, "correlation_id", "-"),
+            "message": redact_pii(record.getMessage()),
+        }
+        if getattr(record, "sampled_out", 0):
+            entry["sampled_out"] = record.sampled_out
+        return json.dumps(entry, ensure_ascii=False)
+
+def setup_logging(level=logging.INFO, sample_limit=0):
+    """
+    Настраивает неблокирующее логирование
+
+    Обработчики бота только кладут запись в очередь; форматирование,
+    удаление персональных данных и запись в stderr выполняются в фоновом потоке.
+    Текст исключения (logger.exception) входит в поле message.
+
+    Args:
+        level (int | str): Уровень логирования, например logging.INFO или "INFO"
+        sample_limit (int): Максимум записей в секунду для одного места вызова; 0 - без ограничения
+
+    Returns:
+        QueueListener: Запущенный фоновый обработчик
+    """
+    log_queue = queue.SimpleQueue()
+
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_limit))
+    queue_handler.addFilter(ContextFilter())
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter())
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    # httpx логирует каждый запрос к Telegram API на уровне INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    return listener
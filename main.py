@@ -1,10 +1,23 @@
+import asyncio
+import atexit
 import logging
 import os
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from sheets_manager import SheetsManager
+from telegram.ext import Application, CommandHandler, MessageHandler, TypeHandler, filters, ContextTypes
+from sheets_manager import SheetsManager, generate_record_id
 from validators import validate_phone, validate_email
 from bot_states import UserStates
+from config import (
+    ADMIN_IDS, PROFILING_WINDOW_SECONDS,
+    ARCHIVE_MAX_AGE_DAYS, ARCHIVE_MAX_ROWS, ARCHIVE_INTERVAL_SECONDS,
+    LOG_LEVEL, LOG_SAMPLE_LIMIT, PROFILING_ENABLED
+)
+from logging_setup import setup_logging, set_correlation_id, reset_correlation_id
+from profiling import profiler, profiled
+
+# Валидаторы оборачиваются здесь, чтобы validators.py не зависел от config
+validate_phone = profiled("validators.validate_phone")(validate_phone)
+validate_email = profiled("validators.validate_email")(validate_email)
 
 # Получаем токен бота из переменных окружения
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -13,25 +26,28 @@ if not BOT_TOKEN:
     raise ValueError("TELEGRAM_BOT_TOKEN environment variable is required")
 
 # Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+setup_logging(level=LOG_LEVEL, sample_limit=LOG_SAMPLE_LIMIT)
 logger = logging.getLogger(__name__)
 
 # Глобальные переменные для состояний пользователей
 user_states = {}
 user_data = {}
 
+# Токены ID корреляции обрабатываемых обновлений (update_id -> Token)
+correlation_tokens = {}
+
 # Инициализация менеджера Google Sheets
 sheets_manager = SheetsManager()
 
-def get_main_keyboard():
+def get_main_keyboard(retry=False):
     """Создает основную клавиатуру с кнопкой для добавления записи"""
     keyboard = [
         [KeyboardButton("➕ Добавить запись")],
         [KeyboardButton("📋 Показать данные"), KeyboardButton("🔄 Очистить")]
     ]
+    if retry:
+        # После неудачного сохранения предлагаем повторить его с той же формой
+        keyboard.insert(0, [KeyboardButton("🔁 Повторить сохранение")])
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=False)
 
 def get_cancel_keyboard():
@@ -41,6 +57,17 @@ def get_cancel_keyboard():
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
 
+async def bind_update_context(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Привязывает записи лога к ID обрабатываемого обновления"""
+    correlation_tokens[update.update_id] = set_correlation_id(update.update_id)
+
+async def unbind_update_context(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Отвязывает записи лога от обновления после выполнения всех обработчиков"""
+    token = correlation_tokens.pop(update.update_id, None)
+    if token:
+        reset_correlation_id(token)
+
+@profiled("handler.start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /start"""
     user_id = update.effective_user.id
@@ -77,6 +104,10 @@ async def handle_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             reply_markup=get_cancel_keyboard()
         )
     
+    elif text == "🔁 Повторить сохранение" and user_data.get(user_id, {}).get("record_id"):
+        # Повторное сохранение использует тот же ID записи и проверяет его перед добавлением
+        await save_data(update, context)
+    
     elif text == "📋 Показать данные":
         await show_current_data(update, context)
     
@@ -244,11 +275,24 @@ async def show_current_data(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def save_data(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Сохраняет данные в Google Sheets"""
     user_id = update.effective_user.id
-    data = user_data.get(user_id, {"phone": "", "email": "", "name": "", "type": ""})
+    data = user_data.setdefault(user_id, {"phone": "", "email": "", "name": "", "type": ""})
+    
+    # ID записи закрепляется за формой: после ошибки форма сохраняется,
+    # и "🔁 Повторить сохранение" отправляет ее с тем же ID. Если ID уже есть,
+    # прошлая попытка могла дойти до таблицы, поэтому сначала проверяем его
+    is_retry = bool(data.get("record_id"))
+    if not is_retry:
+        data["record_id"] = generate_record_id()
     
     try:
-        # Сохраняем данные в Google Sheets
-        success = sheets_manager.add_row([data["phone"], data["email"], data["name"], data["type"]])
+        # Сохраняем данные в Google Sheets в отдельном потоке, чтобы запросы
+        # и паузы между повторами не блокировали обработку других пользователей
+        success = await asyncio.to_thread(
+            sheets_manager.add_row,
+            [data["phone"], data["email"], data["name"], data["type"]],
+            record_id=data["record_id"],
+            verify_first=is_retry
+        )
         
         if success:
             user_states[user_id] = UserStates.MAIN_MENU
@@ -263,21 +307,32 @@ async def save_data(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             )
             # Очищаем данные после успешного сохранения
             user_data[user_id] = {"phone": "", "email": "", "name": "", "type": ""}
+        elif not sheets_manager.is_available():
+            # Предохранитель разомкнут - сообщаем сразу, не дожидаясь таймаута
+            user_states[user_id] = UserStates.MAIN_MENU
+            await update.message.reply_text(
+                "⚠️ Google Sheets временно недоступен, запись не сохранена. "
+                "Нажмите '🔁 Повторить сохранение' через несколько минут.",
+                reply_markup=get_main_keyboard(retry=True)
+            )
         else:
             user_states[user_id] = UserStates.MAIN_MENU
             await update.message.reply_text(
-                "❌ Ошибка при сохранении данных в Google Sheets. Попробуйте позже.",
-                reply_markup=get_main_keyboard()
+                "❌ Ошибка при сохранении данных в Google Sheets. "
+                "Нажмите '🔁 Повторить сохранение', чтобы попробовать еще раз.",
+                reply_markup=get_main_keyboard(retry=True)
             )
     
     except Exception as e:
         logger.error(f"Ошибка при сохранении данных: {e}")
         user_states[user_id] = UserStates.MAIN_MENU
         await update.message.reply_text(
-            "❌ Произошла ошибка при сохранении данных. Попробуйте позже.",
-            reply_markup=get_main_keyboard()
+            "❌ Произошла ошибка при сохранении данных. "
+            "Нажмите '🔁 Повторить сохранение', чтобы попробовать еще раз.",
+            reply_markup=get_main_keyboard(retry=True)
         )
 
+@profiled("handler.handle_message")
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Основной обработчик сообщений"""
     user_id = update.effective_user.id
@@ -300,6 +355,50 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     elif current_state == UserStates.WAITING_TYPE:
         await handle_type_input(update, context)
 
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик команды /profile [секунды|off] (только для администраторов)"""
+    user_id = update.effective_user.id
+    
+    if user_id not in ADMIN_IDS:
+        return
+    
+    if context.args and context.args[0] == "off":
+        profiler.disable()
+        await update.message.reply_text("⏹️ Профилирование выключено.")
+        return
+    
+    try:
+        seconds = int(context.args[0]) if context.args else PROFILING_WINDOW_SECONDS
+    except ValueError:
+        seconds = 0
+    
+    if seconds <= 0:
+        await update.message.reply_text("❌ Использование: /profile [секунды|off]")
+        return
+    
+    profiler.enable(seconds)
+    await update.message.reply_text(f"⏱️ Профилирование включено на {seconds} сек.")
+
+async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик команды /status (только для администраторов)"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    
+    status = sheets_manager.get_status()
+    await update.message.reply_text(
+        "🩺 Google Sheets:\n"
+        f"Клиент инициализирован: {'да' if status['initialized'] else 'нет'}\n"
+        f"Предохранитель: {status['state']}\n"
+        f"Ошибок подряд: {status['failures']}"
+    )
+
+async def archive_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Периодическая задача: переносит старые строки в архивные листы"""
+    # Архивация читает и переписывает таблицу целиком - выполняем ее в отдельном потоке
+    archived = await asyncio.to_thread(sheets_manager.archive_rows, ARCHIVE_MAX_AGE_DAYS, ARCHIVE_MAX_ROWS)
+    if archived:
+        logger.info(f"Перенесено в архив строк: {archived}")
+
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик ошибок"""
     logger.error(f"Произошла ошибка: {context.error}")
@@ -312,13 +411,29 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
 def main() -> None:
     """Основная функция запуска бота"""
+    # Профилирование с момента запуска (после настройки логирования); результаты сохраняются при завершении
+    if PROFILING_ENABLED:
+        profiler.enable()
+        atexit.register(profiler.disable, wait=True)
+    
     # Создаем приложение
     application = Application.builder().token(BOT_TOKEN).build()
     
-    # Добавляем обработчики
+    # Добавляем обработчики (группа -1 выполняется перед остальными, группа 99 - после)
+    application.add_handler(TypeHandler(Update, bind_update_context), group=-1)
+    application.add_handler(TypeHandler(Update, unbind_update_context), group=99)
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("profile", profile_command))
+    application.add_handler(CommandHandler("status", status_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     
+    # Планируем архивацию старых строк
+    if ARCHIVE_MAX_AGE_DAYS or ARCHIVE_MAX_ROWS:
+        if application.job_queue:
+            application.job_queue.run_repeating(archive_job, interval=ARCHIVE_INTERVAL_SECONDS, first=60)
+        else:
+            logger.warning("JobQueue недоступна, архивация отключена (установите python-telegram-bot[job-queue])")
+    
     # Добавляем обработчик ошибок
     application.add_error_handler(error_handler)
     
@@ -0,0 +1,269 @@
+import cProfile
+import functools
+import inspect
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from config import PROFILING_DIR, PROFILING_SAMPLE_RATE, SLOW_CALL_THRESHOLD_MS
+
+logger = logging.getLogger(__name__)
+
+class _Suspend:
+    """Передает событие, на котором остановилась корутина, в цикл событий"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __await__(self):
+        return (yield self.value)
+
+class _Window:
+    """Окно профилирования: отдельный cProfile для каждого потока"""
+
+    def __init__(self):
+        # ID потока -> cProfile этого потока
+        self.profiles = {}
+        # Потоки, в которых профиль сейчас используется
+        self.busy = set()
+        self.closed = False
+
+class Profiler:
+    """
+    Профилирование обработчиков и вызовов Google Sheets по запросу
+
+    Пока профилирование выключено, обернутые функции вызываются напрямую
+    после одной проверки срока окна. Во время окна попавшие в выборку вызовы
+    собираются в cProfile своего потока; при закрытии окна статистика всех
+    потоков объединяется в один файл и сохраняется вместе со снимком tracemalloc.
+    """
+
+    def __init__(self):
+        # Момент (time.monotonic), до которого включено профилирование; 0 - выключено
+        self.enabled_until = 0
+        self._lock = threading.Lock()
+        self._window = None
+        self._timer = None
+
+    def enable(self, seconds=None):
+        """
+        Включает профилирование
+
+        Args:
+            seconds (float): Длительность окна; None - до вызова disable()
+        """
+        os.makedirs(PROFILING_DIR, exist_ok=True)
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            if self._window is None:
+                self._window = _Window()
+            self.enabled_until = time.monotonic() + seconds if seconds else float("inf")
+            if seconds:
+                # Окно закрывается по таймеру, даже если профилируемых вызовов больше не будет
+                self._timer = threading.Timer(seconds, self.disable)
+                self._timer.daemon = True
+                self._timer.start()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        logger.info(f"Profiling enabled for {seconds or 'unlimited'} s, output: {PROFILING_DIR}")
+
+    def disable(self, wait=False):
+        """
+        Выключает профилирование и сохраняет результаты окна в фоновом потоке
+
+        Args:
+            wait (bool): Дождаться сохранения (например, при завершении процесса)
+        """
+        with self._lock:
+            if not self.enabled_until:
+                return
+            self.enabled_until = 0
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            window = self._window
+            self._window = None
+            window.closed = True
+            # Если профиль сейчас используется, окно сохранит вызов, который освободит его последним
+            if window.busy:
+                window = None
+
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        tracemalloc.stop()
+
+        saver = threading.Thread(target=self._save, args=(window, snapshot), daemon=True)
+        saver.start()
+        if wait:
+            saver.join()
+        logger.info("Profiling disabled")
+
+    def is_active(self):
+        """Проверяет, идет ли профилирование"""
+        return time.monotonic() < self.enabled_until
+
+    def _output_path(self, name, extension):
+        """Возвращает путь к файлу с результатами профилирования"""
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        return os.path.join(PROFILING_DIR, f"{name}-{timestamp}.{extension}")
+
+    def _save(self, window, snapshot):
+        """Сохраняет объединенную статистику cProfile окна и снимок выделений памяти"""
+        try:
+            stats = None
+            for profile in (window.profiles.values() if window else ()):
+                try:
+                    if stats is None:
+                        stats = pstats.Stats(profile)
+                    else:
+                        stats.add(profile)
+                except TypeError:
+                    # Профиль потока без собранных данных
+                    continue
+            if stats is not None:
+                path = self._output_path("profile", "prof")
+                stats.dump_stats(path)
+                logger.info(f"Profile saved to {path}")
+            if snapshot is not None:
+                path = self._output_path("tracemalloc", "snapshot")
+                snapshot.dump(path)
+                logger.info(f"Allocation snapshot saved to {path}")
+        except Exception as e:
+            logger.error(f"Error saving profiling results: {e}")
+
+    def _claim(self):
+        """
+        Захватывает cProfile текущего потока для вызова, попавшего в выборку
+
+        Вложенные вызовы в том же потоке уже попадают в профиль внешнего
+        вызова и только замеряются по времени; вызовы в других потоках
+        (например, запросы к Google Sheets через asyncio.to_thread)
+        профилируются в cProfile своего потока.
+
+        Returns:
+            tuple: (окно, cProfile) или None, если вызов не профилируется
+        """
+        if random.random() >= PROFILING_SAMPLE_RATE:
+            return None
+        thread_id = threading.get_ident()
+        with self._lock:
+            window = self._window
+            if window is None or thread_id in window.busy:
+                return None
+            window.busy.add(thread_id)
+            profile = window.profiles.setdefault(thread_id, cProfile.Profile())
+            return window, profile
+
+    def _release(self, window):
+        """Освобождает cProfile текущего потока; если окно уже закрыто, сохраняет его"""
+        with self._lock:
+            window.busy.discard(threading.get_ident())
+            save = window.closed and not window.busy
+        if save:
+            threading.Thread(target=self._save, args=(window, None), daemon=True).start()
+
+    def _run_profiled(self, profile, func, args, kwargs):
+        """Выполняет синхронную функцию с включенным профилем"""
+        try:
+            profile.enable()
+        except ValueError:
+            # В Python 3.12+ может быть активен другой профилировщик
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+
+    async def _await_profiled(self, profile, coro):
+        """
+        Выполняет корутину, включая профиль только на время ее собственных шагов
+
+        Пока корутина ждет ввода-вывода, профиль выключен, поэтому в статистику
+        не попадают другие задачи, выполняемые циклом событий в это время.
+        """
+        send_value, error = None, None
+        try:
+            while True:
+                try:
+                    profile.enable()
+                except ValueError:
+                    # В Python 3.12+ может быть активен другой профилировщик
+                    profile = None
+                try:
+                    if error is not None:
+                        suspended_on = coro.throw(error)
+                    else:
+                        suspended_on = coro.send(send_value)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    if profile is not None:
+                        profile.disable()
+
+                try:
+                    send_value, error = await _Suspend(suspended_on), None
+                except BaseException as e:
+                    send_value, error = None, e
+        finally:
+            coro.close()
+
+    def _finish(self, name, started):
+        """Пишет время вызова в лог"""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms >= SLOW_CALL_THRESHOLD_MS:
+            logger.warning(f"Slow call {name}: {elapsed_ms:.1f} ms")
+        else:
+            logger.info(f"Call {name}: {elapsed_ms:.1f} ms")
+
+    def wrap(self, name=None):
+        """
+        Декоратор для профилирования синхронных и асинхронных функций
+
+        Args:
+            name (str): Имя вызова в логах; по умолчанию имя функции
+        """
+        def decorator(func):
+            call_name = name or func.__qualname__
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.is_active():
+                        return await func(*args, **kwargs)
+                    started = time.perf_counter()
+                    claimed = self._claim()
+                    try:
+                        if claimed is None:
+                            return await func(*args, **kwargs)
+                        return await self._await_profiled(claimed[1], func(*args, **kwargs))
+                    finally:
+                        if claimed is not None:
+                            self._release(claimed[0])
+                        self._finish(call_name, started)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.is_active():
+                    return func(*args, **kwargs)
+                started = time.perf_counter()
+                claimed = self._claim()
+                try:
+                    if claimed is None:
+                        return func(*args, **kwargs)
+                    return self._run_profiled(claimed[1], func, args, kwargs)
+                finally:
+                    if claimed is not None:
+                        self._release(claimed[0])
+                    self._finish(call_name, started)
+            return wrapper
+
+        return decorator
+
+profiler = Profiler()
+profiled = profiler.wrap
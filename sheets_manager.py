@@ -1,36 +1,111 @@
 import gspread
-from config import GOOGLE_CREDENTIALS, GOOGLE_SHEETS_ID, GOOGLE_SHEETS_RANGE
+from config import (
+    GOOGLE_CREDENTIALS, GOOGLE_SHEETS_ID, GOOGLE_SHEETS_RANGE, SHEETS_APPEND_RETRIES, SHEETS_RETRY_BACKOFF_SECONDS,
+    SHEETS_TIMEOUT_SECONDS, SHEETS_FAILURE_THRESHOLD, SHEETS_PROBE_INITIAL_DELAY, SHEETS_PROBE_MAX_DELAY
+)
 import logging
+import time
+import uuid
 from datetime import datetime
+from circuit_breaker import CircuitBreaker
+from profiling import profiled
 
 logger = logging.getLogger(__name__)
 
+# Заголовки таблицы: 4 поля формы + служебные столбцы
+DATA_HEADERS = ["Телефон", "Email", "Имя", "Тайп"]
+EXPECTED_HEADERS = DATA_HEADERS + ["ID записи", "Время"]
+
+# Номер столбца с ID записи (нумерация с 1)
+RECORD_ID_COLUMN = len(DATA_HEADERS) + 1
+RECORD_ID_LETTER = chr(ord("A") + RECORD_ID_COLUMN - 1)
+TIMESTAMP_COLUMN = RECORD_ID_COLUMN + 1
+LAST_COLUMN = chr(ord("A") + len(EXPECTED_HEADERS) - 1)
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Название листа архива по месяцу записи; строки без времени попадают в отдельный лист
+ARCHIVE_TITLE_FORMAT = "Архив {month}"
+ARCHIVE_UNDATED_MONTH = "без даты"
+
+def generate_record_id():
+    """Генерирует уникальный ID записи"""
+    return uuid.uuid4().hex
+
 class SheetsManager:
     """Менеджер для работы с Google Sheets"""
     
     def __init__(self):
         self.client = None
+        self.spreadsheet = None
         self.sheet = None
-        self.initialize_client()
+        self.breaker = CircuitBreaker(
+            "google-sheets",
+            probe=self._probe,
+            failure_threshold=SHEETS_FAILURE_THRESHOLD,
+            initial_delay=SHEETS_PROBE_INITIAL_DELAY,
+            max_delay=SHEETS_PROBE_MAX_DELAY
+        )
+        
+        if not self.initialize_client():
+            # Переподключаемся в фоне, не дожидаясь перезапуска бота
+            self.breaker.open()
     
+    @profiled("sheets.initialize_client")
     def initialize_client(self):
-        """Инициализирует клиент Google Sheets"""
+        """
+        Инициализирует клиент Google Sheets
+        
+        Returns:
+            bool: True если успешно, False в случае ошибки
+        """
         try:
             if not GOOGLE_CREDENTIALS:
                 raise ValueError("Google credentials not available")
             
             self.client = gspread.authorize(GOOGLE_CREDENTIALS)
-            self.sheet = self.client.open_by_key(GOOGLE_SHEETS_ID).sheet1
+            self.client.set_timeout(SHEETS_TIMEOUT_SECONDS)
+            self.spreadsheet = self.client.open_by_key(GOOGLE_SHEETS_ID)
+            self.sheet = self.spreadsheet.sheet1
             
             # Проверяем и создаем заголовки, если таблица пустая
             self._ensure_headers()
             
             logger.info("Google Sheets client initialized successfully")
+            return True
             
         except Exception as e:
             logger.error(f"Failed to initialize Google Sheets client: {e}")
             self.client = None
+            self.spreadsheet = None
             self.sheet = None
+            return False
+    
+    def _probe(self):
+        """Фоновая проверка для предохранителя: при восстановлении переподключает клиент"""
+        if self.sheet and not self.test_connection():
+            return False
+        return self.initialize_client()
+    
+    def is_available(self):
+        """
+        Проверяет, можно ли сейчас обращаться к Google Sheets
+        
+        Returns:
+            bool: False если клиент не инициализирован или предохранитель разомкнут
+        """
+        return self.sheet is not None and self.breaker.allow_request()
+    
+    def get_status(self):
+        """
+        Возвращает состояние подключения к Google Sheets
+        
+        Returns:
+            dict: Состояние предохранителя и признак инициализации клиента
+        """
+        status = self.breaker.get_status()
+        status["initialized"] = self.sheet is not None
+        return status
     
     def _ensure_headers(self):
         """Убеждается, что в таблице есть заголовки"""
@@ -38,50 +113,113 @@ class SheetsManager:
             # Получаем первую строку
             first_row = self.sheet.row_values(1)
             
-            # Если первая строка пустая или не содержит нужные заголовки
-            expected_headers = ["Телефон", "Email", "Имя", "Тайп"]
+            if first_row == EXPECTED_HEADERS:
+                return
             
-            if not first_row or first_row != expected_headers:
-                # Добавляем заголовки
-                self.sheet.insert_row(expected_headers, 1)
+            if first_row == DATA_HEADERS:
+                # Старый формат заголовков - дописываем служебные столбцы
+                self.sheet.update(range_name=f"A1:{LAST_COLUMN}1", values=[EXPECTED_HEADERS])
+                logger.info("Headers upgraded with record ID and timestamp columns")
+            else:
+                # Если первая строка пустая или не содержит нужные заголовки
+                self.sheet.insert_row(EXPECTED_HEADERS, 1)
                 logger.info("Headers added to the spreadsheet")
             
         except Exception as e:
             logger.error(f"Error ensuring headers: {e}")
     
-    def add_row(self, data):
+    @profiled("sheets.add_row")
+    def add_row(self, data, record_id=None, verify_first=False):
         """
         Добавляет строку с данными в таблицу
         
+        К данным дописываются ID записи и временная метка. Если запрос
+        завершился ошибкой (например, таймаутом), перед повторной попыткой
+        проверяется, не была ли строка с этим ID уже записана, чтобы
+        не создавать дубликатов.
+        
         Args:
             data (list): Список данных [телефон, email, имя, тип]
+            record_id (str): ID записи; если не указан, генерируется новый
+            verify_first (bool): Проверить ID и перед первой попыткой
+                (повторная отправка формы, которая могла быть уже записана)
         
         Returns:
             bool: True если успешно, False в случае ошибки
         """
-        if not self.sheet:
-            logger.error("Google Sheets not initialized")
+        if not self.is_available():
+            logger.error("Google Sheets not available")
             return False
         
-        try:
-            # Добавляем временную метку для отладки
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Проверяем, что данные содержат 4 элемента
+        if len(data) != len(DATA_HEADERS):
+            logger.error(f"Invalid data length: expected {len(DATA_HEADERS)}, got {len(data)}")
+            return False
+        
+        if not record_id:
+            record_id = generate_record_id()
+        
+        timestamp = datetime.now().strftime(TIMESTAMP_FORMAT)
+        row = list(data) + [record_id, timestamp]
+        
+        for attempt in range(1, SHEETS_APPEND_RETRIES + 2):
+            if not self.breaker.allow_request():
+                break
             
-            # Проверяем, что данные содержат 4 элемента
-            if len(data) != 4:
-                logger.error(f"Invalid data length: expected 4, got {len(data)}")
-                return False
+            if attempt > 1:
+                # Пауза перед повтором, чтобы не повторять запрос сразу после таймаута
+                time.sleep(SHEETS_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 2))
             
-            # Добавляем строку в конец таблицы
-            self.sheet.append_row(data)
+            if attempt > 1 or verify_first:
+                found = self.has_record(record_id)
+                if found:
+                    # Предыдущая попытка на самом деле дошла до сервера
+                    logger.info(f"Row {record_id} already present after failed attempt, skipping append")
+                    return True
+                if found is None:
+                    # Не удалось проверить - повторное добавление может создать дубликат
+                    logger.error(f"Cannot verify row {record_id} after failed attempt, not retrying")
+                    return False
             
-            logger.info(f"Row added successfully at {timestamp}: {data}")
-            return True
+            try:
+                # Добавляем строку в конец таблицы
+                self.sheet.append_row(row)
+                self.breaker.record_success()
+                logger.info(f"Row {record_id} added successfully at {timestamp}")
+                return True
             
+            except Exception as e:
+                logger.error(f"Error adding row {record_id} to spreadsheet (attempt {attempt}): {e}")
+                self.breaker.record_failure()
+        
+        # Последняя попытка тоже могла дойти до сервера
+        return self.has_record(record_id) is True
+    
+    @profiled("sheets.has_record")
+    def has_record(self, record_id):
+        """
+        Проверяет, есть ли в таблице строка с указанным ID записи
+        
+        Args:
+            record_id (str): ID записи
+        
+        Returns:
+            bool: True если строка найдена, False если нет,
+                None если проверить не удалось (ошибка или таблица недоступна)
+        """
+        if not self.is_available():
+            return None
+        
+        try:
+            found = record_id in self.sheet.col_values(RECORD_ID_COLUMN)
+            self.breaker.record_success()
+            return found
         except Exception as e:
-            logger.error(f"Error adding row to spreadsheet: {e}")
-            return False
+            logger.error(f"Error checking record {record_id}: {e}")
+            self.breaker.record_failure()
+            return None
     
+    @profiled("sheets.get_all_data")
     def get_all_data(self):
         """
         Получает все данные из таблицы
@@ -89,16 +227,20 @@ class SheetsManager:
         Returns:
             list: Список всех строк или None в случае ошибки
         """
-        if not self.sheet:
-            logger.error("Google Sheets not initialized")
+        if not self.is_available():
+            logger.error("Google Sheets not available")
             return None
         
         try:
-            return self.sheet.get_all_records()
+            records = self.sheet.get_all_records()
+            self.breaker.record_success()
+            return records
         except Exception as e:
             logger.error(f"Error getting data from spreadsheet: {e}")
+            self.breaker.record_failure()
             return None
     
+    @profiled("sheets.clear_all_data")
     def clear_all_data(self):
         """
         Очищает все данные в таблице (кроме заголовков)
@@ -106,8 +248,8 @@ class SheetsManager:
         Returns:
             bool: True если успешно, False в случае ошибки
         """
-        if not self.sheet:
-            logger.error("Google Sheets not initialized")
+        if not self.is_available():
+            logger.error("Google Sheets not available")
             return False
         
         try:
@@ -116,16 +258,144 @@ class SheetsManager:
             
             if len(all_values) > 1:  # Если есть данные кроме заголовков
                 # Очищаем все строки кроме первой (заголовки)
-                range_to_clear = f"A2:D{len(all_values)}"
+                range_to_clear = f"A2:{LAST_COLUMN}{len(all_values)}"
                 self.sheet.batch_clear([range_to_clear])
                 logger.info("All data cleared from spreadsheet")
             
+            self.breaker.record_success()
             return True
             
         except Exception as e:
             logger.error(f"Error clearing spreadsheet: {e}")
+            self.breaker.record_failure()
             return False
     
+    @profiled("sheets.archive_rows")
+    def archive_rows(self, max_age_days=0, max_rows=0):
+        """
+        Переносит старые строки из основной таблицы в архивные листы по месяцам
+        
+        Строки добавляются только в конец таблицы, поэтому архивируется
+        начальный блок строк: все строки старше max_age_days дней, а также
+        все строки сверх max_rows последних. Строки без времени переносятся
+        только по ограничению max_rows. Строки копируются одним запросом
+        на каждый архивный лист и затем удаляются из основной таблицы одним
+        запросом. Если копирование не удалось, удаление не выполняется;
+        уже скопированные строки при следующем запуске распознаются по ID
+        и не дублируются (строкам без ID он присваивается перед копированием).
+        
+        Args:
+            max_age_days (int): Максимальный возраст строки в днях; 0 - не учитывать
+            max_rows (int): Максимальное число строк в основной таблице; 0 - не учитывать
+        
+        Returns:
+            int: Количество перенесенных строк или None в случае ошибки
+        """
+        if not self.is_available():
+            logger.error("Google Sheets not available")
+            return None
+        
+        try:
+            rows = self.sheet.get_all_values()[1:]
+            
+            archive_count = 0
+            if max_rows and len(rows) > max_rows:
+                archive_count = len(rows) - max_rows
+            
+            if max_age_days:
+                cutoff = datetime.now().timestamp() - max_age_days * 86400
+                age_count = 0
+                for row in rows:
+                    created = self._row_timestamp(row)
+                    # Строки без времени (записанные до появления столбца) по возрасту не переносятся
+                    if not created or created.timestamp() >= cutoff:
+                        break
+                    age_count += 1
+                archive_count = max(archive_count, age_count)
+            
+            if not archive_count:
+                return 0
+            
+            rows = rows[:archive_count]
+            self._assign_missing_ids(rows)
+            
+            # Группируем строки по месяцу создания
+            rows_by_month = {}
+            for row in rows:
+                created = self._row_timestamp(row)
+                month = created.strftime("%Y-%m") if created else ARCHIVE_UNDATED_MONTH
+                rows_by_month.setdefault(month, []).append(row)
+            
+            for month, month_rows in rows_by_month.items():
+                self._append_to_archive(ARCHIVE_TITLE_FORMAT.format(month=month), month_rows)
+            
+            # Удаляем перенесенные строки (после заголовков) одним запросом
+            self.sheet.delete_rows(2, archive_count + 1)
+            
+            logger.info(f"Archived {archive_count} rows into {len(rows_by_month)} worksheets")
+            self.breaker.record_success()
+            return archive_count
+            
+        except Exception as e:
+            logger.error(f"Error archiving rows: {e}")
+            self.breaker.record_failure()
+            return None
+    
+    def _row_timestamp(self, row):
+        """Возвращает время создания строки или None, если оно не указано"""
+        if len(row) < TIMESTAMP_COLUMN or not row[TIMESTAMP_COLUMN - 1]:
+            return None
+        try:
+            return datetime.strptime(row[TIMESTAMP_COLUMN - 1], TIMESTAMP_FORMAT)
+        except ValueError:
+            return None
+    
+    def _assign_missing_ids(self, rows):
+        """
+        Присваивает ID записи строкам без него (записанным до появления столбца)
+        
+        ID сохраняются в основной таблице одним запросом до копирования,
+        поэтому повторный запуск после сбоя сопоставляет строки с архивом по ID.
+        
+        Args:
+            rows (list): Строки основной таблицы, начиная со второй; дополняются на месте
+        """
+        updates = []
+        for index, row in enumerate(rows):
+            if len(row) < RECORD_ID_COLUMN:
+                row.extend([""] * (RECORD_ID_COLUMN - len(row)))
+            if not row[RECORD_ID_COLUMN - 1]:
+                row[RECORD_ID_COLUMN - 1] = generate_record_id()
+                id_cell = f"{RECORD_ID_LETTER}{index + 2}"
+                updates.append({"range": id_cell, "values": [[row[RECORD_ID_COLUMN - 1]]]})
+        
+        if updates:
+            self.sheet.batch_update(updates)
+            logger.info(f"Assigned record IDs to {len(updates)} legacy rows before archiving")
+    
+    def _append_to_archive(self, title, rows):
+        """
+        Добавляет строки в архивный лист, создавая его при необходимости
+        
+        Строки с ID, уже перенесенные прошлым незавершенным запуском, пропускаются.
+        """
+        try:
+            worksheet = self.spreadsheet.worksheet(title)
+            archived_ids = set(worksheet.col_values(RECORD_ID_COLUMN)[1:])
+        except gspread.WorksheetNotFound:
+            worksheet = self.spreadsheet.add_worksheet(title, rows=1, cols=len(EXPECTED_HEADERS))
+            worksheet.append_rows([EXPECTED_HEADERS])
+            archived_ids = set()
+        
+        new_rows = [row for row in rows if row[RECORD_ID_COLUMN - 1] not in archived_ids]
+        
+        if len(new_rows) < len(rows):
+            logger.info(f"Skipped {len(rows) - len(new_rows)} rows already present in {title}")
+        
+        if new_rows:
+            worksheet.append_rows(new_rows)
+    
+    @profiled("sheets.test_connection")
     def test_connection(self):
         """
         Тестирует соединение с Google Sheets
@@ -137,7 +407,8 @@ class SheetsManager:
             if not self.sheet:
                 return False
             
-            # Пытаемся получить название листа
+            # Запрашиваем метаданные таблицы, чтобы проверить доступность API
+            self.spreadsheet.fetch_sheet_metadata()
             sheet_title = self.sheet.title
             logger.info(f"Connection test successful. Sheet title: {sheet_title}")
             return True
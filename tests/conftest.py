@@ -0,0 +1,8 @@
+import os
+
+# config.py читает переменные окружения при импорте: задаем тестовые значения
+# (некорректный service account - клиент Google Sheets не инициализируется)
+os.environ.setdefault("GOOGLE_SHEETS_ID", "test-sheet")
+os.environ.setdefault("GOOGLE_SERVICE_ACCOUNT_JSON", "{}")
+os.environ.setdefault("SHEETS_RETRY_BACKOFF_SECONDS", "0")
+os.environ.setdefault("SHEETS_PROBE_INITIAL_DELAY", "3600")
@@ -0,0 +1,47 @@
+import time
+
+from circuit_breaker import BreakerState, CircuitBreaker
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", probe=lambda: False, failure_threshold=2, initial_delay=60)
+
+    breaker.record_failure()
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert not breaker.allow_request()
+    assert breaker.state == BreakerState.OPEN
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker("test", probe=lambda: False, failure_threshold=2, initial_delay=60)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow_request()
+
+
+def test_closes_when_probe_succeeds():
+    probes = []
+
+    def probe():
+        probes.append(1)
+        return len(probes) >= 2
+
+    breaker = CircuitBreaker("test", probe=probe, failure_threshold=1, initial_delay=0.01, max_delay=0.02)
+    breaker.record_failure()
+
+    assert wait_for(breaker.allow_request)
+    assert len(probes) == 2
+    assert breaker.get_status()["state"] == "closed"
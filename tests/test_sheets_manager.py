@@ -0,0 +1,131 @@
+import pytest
+
+gspread = pytest.importorskip("gspread")
+pytest.importorskip("google_auth_oauthlib")
+
+from circuit_breaker import CircuitBreaker
+from sheets_manager import (
+    SheetsManager, ARCHIVE_TITLE_FORMAT, ARCHIVE_UNDATED_MONTH, EXPECTED_HEADERS, RECORD_ID_COLUMN
+)
+
+
+class FlakySheet:
+    """Лист, у которого первый append_row записывает строку, но завершается таймаутом"""
+
+    def __init__(self, lookup_failures=0):
+        self.rows = []
+        self.append_calls = 0
+        self.lookup_failures = lookup_failures
+
+    def append_row(self, row):
+        self.append_calls += 1
+        self.rows.append(row)
+        if self.append_calls == 1:
+            raise TimeoutError("append timed out")
+
+    def col_values(self, column):
+        if self.lookup_failures:
+            self.lookup_failures -= 1
+            raise TimeoutError("lookup timed out")
+        return [row[column - 1] for row in self.rows]
+
+
+def make_manager(sheet):
+    manager = SheetsManager()
+    manager.breaker = CircuitBreaker("test", probe=lambda: True, failure_threshold=100)
+    manager.sheet = sheet
+    return manager
+
+
+def test_add_row_skips_append_when_timed_out_row_was_written():
+    sheet = FlakySheet()
+    manager = make_manager(sheet)
+
+    assert manager.add_row(["+79991234567", "a@b.ru", "Иван", "x"], record_id="R1")
+    assert [row[RECORD_ID_COLUMN - 1] for row in sheet.rows] == ["R1"]
+
+
+def test_add_row_does_not_reappend_when_check_fails():
+    sheet = FlakySheet(lookup_failures=1)
+    manager = make_manager(sheet)
+
+    assert not manager.add_row(["+79991234567", "a@b.ru", "Иван", "x"], record_id="R1")
+    assert len(sheet.rows) == 1
+
+
+def test_resubmission_with_verify_first_does_not_duplicate():
+    sheet = FlakySheet(lookup_failures=1)
+    manager = make_manager(sheet)
+    data = ["+79991234567", "a@b.ru", "Иван", "x"]
+
+    assert not manager.add_row(data, record_id="R1")
+    assert manager.add_row(data, record_id="R1", verify_first=True)
+    assert [row[RECORD_ID_COLUMN - 1] for row in sheet.rows] == ["R1"]
+
+
+def test_has_record_is_inconclusive_on_error():
+    manager = make_manager(FlakySheet(lookup_failures=1))
+
+    assert manager.has_record("R1") is None
+    assert manager.has_record("R1") is False
+
+
+class FakeWorksheet:
+    """Лист в памяти с поддержкой операций, используемых при архивации"""
+
+    def __init__(self, rows, fail_delete=False):
+        self.rows = [list(row) for row in rows]
+        self.fail_delete = fail_delete
+
+    def get_all_values(self):
+        return [list(row) for row in self.rows]
+
+    def col_values(self, column):
+        return [row[column - 1] if len(row) >= column else "" for row in self.rows]
+
+    def batch_update(self, updates):
+        for update in updates:
+            row = self.rows[int(update["range"][1:]) - 1]
+            row.extend([""] * (RECORD_ID_COLUMN - len(row)))
+            row[RECORD_ID_COLUMN - 1] = update["values"][0][0]
+
+    def append_rows(self, rows):
+        self.rows.extend(list(row) for row in rows)
+
+    def delete_rows(self, start, end):
+        if self.fail_delete:
+            raise TimeoutError("delete timed out")
+        del self.rows[start - 1:end]
+
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self.worksheets = {}
+
+    def worksheet(self, title):
+        if title not in self.worksheets:
+            raise gspread.WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def add_worksheet(self, title, rows, cols):
+        self.worksheets[title] = FakeWorksheet([])
+        return self.worksheets[title]
+
+
+def test_archive_rerun_keeps_identical_legacy_rows_without_duplicates():
+    legacy_row = ["+79991234567", "a@b.ru", "Иван", "x"]
+    sheet = FakeWorksheet(
+        [EXPECTED_HEADERS, legacy_row, legacy_row, legacy_row + ["R3", "2099-01-01 00:00:00"]],
+        fail_delete=True
+    )
+    manager = make_manager(sheet)
+    manager.spreadsheet = FakeSpreadsheet()
+
+    # Копирование прошло, удаление - нет
+    assert manager.archive_rows(max_rows=1) is None
+    sheet.fail_delete = False
+    assert manager.archive_rows(max_rows=1) == 2
+
+    archive = manager.spreadsheet.worksheets[ARCHIVE_TITLE_FORMAT.format(month=ARCHIVE_UNDATED_MONTH)]
+    assert len(archive.rows) == 3
+    assert [row[RECORD_ID_COLUMN - 1] for row in sheet.rows[1:]] == ["R3"]
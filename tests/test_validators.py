@@ -0,0 +1,28 @@
+from validators import redact_pii
+
+
+def test_redacts_phone_and_email():
+    text = "Телефон +7 999 123-45-67, email Foo@Bar.com"
+    assert redact_pii(text) == "Телефон [phone], email [email]"
+
+
+def test_redacts_phone_followed_by_short_number():
+    assert redact_pii("89991234567 2") == "[phone] 2"
+
+
+def test_redacts_phone_preceded_by_short_number():
+    assert redact_pii("2 89991234567") == "2 [phone]"
+
+
+def test_redacts_formatted_phone_next_to_short_number():
+    assert redact_pii("8 (999) 123-45-67 2") == "[phone] 2"
+
+
+def test_keeps_timestamps_and_record_ids():
+    text = "Row 3f2a1234567890abc added at 2026-10-19 12:00:00"
+    assert redact_pii(text) == text
+
+
+def test_keeps_text_without_pii():
+    assert redact_pii("Call handler.start: 12.5 ms") == "Call handler.start: 12.5 ms"
+    assert redact_pii("") == ""
@@ -1,5 +1,13 @@
 import re
 
+# Паттерн email без привязки к началу и концу строки
+EMAIL_REGEX = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
+
+# Паттерны для поиска email и телефонов внутри произвольного текста
+EMAIL_SEARCH_PATTERN = re.compile(EMAIL_REGEX)
+# (не внутри слов, ID и времени вида 12:00:00)
+PHONE_SEARCH_PATTERN = re.compile(r'(?<![\w:])\+?\d[\d\s\-\(\)]{8,}\d(?![\w:])')
+
 def validate_phone(phone):
     """
     Валидирует номер телефона
@@ -45,7 +53,7 @@ def validate_email(email):
         return False
     
     # Паттерн для валидации email
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    pattern = f'^{EMAIL_REGEX}$'
     
     return re.match(pattern, email.strip()) is not None
 
@@ -135,3 +143,40 @@ def format_email(email):
         return email
     
     return email.strip().lower()
+
+def _redact_phones(fragment):
+    """
+    Заменяет телефоны во фрагменте, найденном PHONE_SEARCH_PATTERN
+    
+    Паттерн может захватить соседние числа (например, '89991234567 2'),
+    поэтому при неудачной проверке ищется самый длинный участок из целых
+    групп цифр, который является телефоном.
+    """
+    if validate_phone(fragment):
+        return '[phone]'
+    
+    groups = [match.span() for match in re.finditer(r'\S+', fragment)]
+    for length in range(len(groups) - 1, 0, -1):
+        for first in range(len(groups) - length + 1):
+            start, end = groups[first][0], groups[first + length - 1][1]
+            if validate_phone(fragment[start:end]):
+                return _redact_phones(fragment[:start]) + '[phone]' + _redact_phones(fragment[end:])
+    
+    return fragment
+
+def redact_pii(text):
+    """
+    Заменяет email и номера телефонов в тексте на заглушки
+    
+    Args:
+        text (str): Текст, например сообщение лога
+    
+    Returns:
+        str: Текст без email и номеров телефонов
+    """
+    if not text:
+        return text
+    
+    text = EMAIL_SEARCH_PATTERN.sub('[email]', text)
+    
+    return PHONE_SEARCH_PATTERN.sub(lambda match: _redact_phones(match.group()), text)